@@ -1,11 +1,15 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-import plotly.express as px
-import plotly.graph_objects as go
-import holidays
 import calendar
+from collections import Counter, defaultdict
+# plotly and holidays are imported inside the functions that use them, so
+# visitors stopped at the login wall don't pay for them; pandas and numpy stay
+# here since the data pipeline and cached-argument hashing need them anyway
 from utils.ui_components import (
     setup_page_config,
     add_custom_css,
@@ -15,13 +19,30 @@ from utils.ui_components import (
 )
 
 
+# Background colors for the Status column of the Detailed Log
+STATUS_BACKGROUNDS = {
+    "OK": "background-color: #dcfce7",
+    "Warning": "background-color: #fef9c3",
+    "Exceeded": "background-color: #fee2e2",
+}
+
+# Figures kept per chart builder, enough for a few recently viewed months
+CHART_CACHE_ENTRIES = 8
+
+# Bar colors for the daily hours chart; any other status is drawn red
+_COLOR_MAP = {"OK": "#10b981", "Warning": "#f59e0b", "Exceeded": "#ef4444"}
+
+
 def get_required_hours(date, il_holidays):
-    """Determine required work hours based on day and holiday status"""
-    date_str = date.strftime("%Y-%m-%d")
+    """Determine required work hours based on day and holiday status
+
+    il_holidays is a set of holiday date ordinals (see get_israeli_holidays).
+    """
+    ordinal = date.toordinal()
     weekday = date.weekday()
 
     # Check if it's a holiday
-    if date_str in il_holidays:
+    if ordinal in il_holidays:
         return 0
 
     # Friday (4) and Saturday (5) - no work
@@ -29,9 +50,7 @@ def get_required_hours(date, il_holidays):
         return 0
 
     # Check if it's a holiday eve
-    next_day = date + timedelta(days=1)
-    next_day_str = next_day.strftime("%Y-%m-%d")
-    if next_day_str in il_holidays:
+    if ordinal + 1 in il_holidays:
         return 7.5
 
     # Regular workday hours
@@ -45,20 +64,18 @@ def get_required_hours(date, il_holidays):
 
 @st.cache_data(ttl=3600)
 def get_israeli_holidays(year):
-    """Fetch and cache Israeli holidays for a given year"""
+    """Fetch and cache Israeli holidays for a given year as date ordinals"""
+    import holidays
+
     try:
         # Get both gregorian years that overlap with the Jewish year
         il_holidays = holidays.IL(years=year)
 
-        # Convert to dictionary format with date strings as keys
-        holiday_dict = {
-            date.strftime("%Y-%m-%d"): name for date, name in il_holidays.items()
-        }
-
-        return holiday_dict
+        # Ordinals let get_required_hours test membership without strftime
+        return frozenset(date.toordinal() for date in il_holidays.keys())
     except Exception as e:
         st.error(f"Failed to fetch holidays: {str(e)}")
-        return {}
+        return frozenset()
 
 
 # Enhanced page config
@@ -66,9 +83,9 @@ st.set_page_config(
     page_title="TimeCamp Dashboard", layout="wide", initial_sidebar_state="expanded"
 )
 
-# Enhanced CSS with new metrics styling and animations
-st.markdown(
-    """
+# Enhanced CSS with new metrics styling and animations, plus the Detailed Log
+# table styles; injected once per run from main()
+_CSS_BLOCK = """
 <style>
     .reportview-container {
         background-color: #f0f2f6;
@@ -133,86 +150,144 @@ st.markdown(
         border-radius: 2px;
         transition: width 0.3s ease;
     }
+    .stDataFrame {
+        font-size: 14px;
+    }
+    .stDataFrame td {
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+        max-width: 150px;
+    }
+    .stDataFrame td a {
+        color: #1a56db;
+        text-decoration: none;
+    }
+    .stDataFrame td a:hover {
+        text-decoration: underline;
+    }
 </style>
-""",
-    unsafe_allow_html=True,
-)
+"""
+
+
+def _inject_css():
+    """Inject the page CSS in a single markdown element"""
+    st.markdown(_CSS_BLOCK, unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_timecamp_session():
+    """Shared HTTP session so TimeCamp connections are pooled across fetches"""
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            # Retry rate limiting and transient server errors with backoff
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[429, 500, 502, 503, 504],
+            ),
+        ),
+    )
+    return session
 
 
-def get_work_hours_and_tasks(api_key, date):
-    """Enhanced version with better error handling and task aggregation"""
+def fetch_entries(session, api_key, from_date, to_date):
+    """Request raw TimeCamp entries for an inclusive "YYYY-MM-DD" range"""
     url = "https://app.timecamp.com/third_party/api/entries"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Accept": "application/json",
     }
     params = {
-        "from": date.strftime("%Y-%m-%d"),
-        "to": date.strftime("%Y-%m-%d"),
+        "from": from_date,
+        "to": to_date,
         "user_ids": "me",
     }
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        entries = response.json()
-
-        # Calculate total duration and handle potential overflow
-        total_seconds = sum(int(entry["duration"]) for entry in entries)
-        hours = min(total_seconds / 3600, 11.5)  # Cap at 11.5 hours like the extension
-
-        # Aggregate tasks with durations
-        tasks_with_duration = {}
-        for entry in entries:
-            task_name = entry["name"] or "Unnamed Task"
-            duration = int(entry["duration"]) / 3600
-            tasks_with_duration[task_name] = (
-                tasks_with_duration.get(task_name, 0) + duration
-            )
+    response = session.get(url, headers=headers, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+# Past days can still be corrected in TimeCamp, so cached ranges expire soon
+# after; the cache only absorbs repeated fetches of the same period
+PAST_ENTRIES_TTL_SECONDS = 120
+
 
-        return hours, tasks_with_duration
+@st.cache_data(ttl=PAST_ENTRIES_TTL_SECONDS, show_spinner=False)
+def fetch_past_entries(_session, api_key, from_date, to_date):
+    """Briefly cached fetch_entries for ranges that ended before today"""
+    return fetch_entries(_session, api_key, from_date, to_date)
 
+
+def get_month_entries(session, api_key, first_day, last_day):
+    """Fetch all entries between first_day and last_day in a single request
+
+    Returns a mapping of "YYYY-MM-DD" to the day's total seconds and per-task
+    hours, or None if the request failed.
+    """
+    from_date = first_day.strftime("%Y-%m-%d")
+    to_date = last_day.strftime("%Y-%m-%d")
+
+    try:
+        # Entries for today can change at any moment, so a range that
+        # includes it always goes to TimeCamp
+        if last_day.date() < datetime.now().date():
+            entries = fetch_past_entries(session, api_key, from_date, to_date)
+        else:
+            entries = fetch_entries(session, api_key, from_date, to_date)
     except requests.exceptions.RequestException as e:
         st.error(f"Failed to fetch data: {str(e)}")
-        return None, {}
-
+        return None
 
-def process_timecamp_data(data, holidays_data, year, month):
-    """Enhanced data processing with running balance and status tracking"""
-    MAX_DAILY_HOURS = 11.5
-    results = []
-    running_balance = 0
+    # Group entries by day, aggregating task durations; at a month's worth of
+    # entries this loop is far cheaper than building a DataFrame to group
+    days = defaultdict(lambda: {"seconds": 0, "tasks": defaultdict(float)})
+    for entry in entries:
+        day = days[entry["date"]]
+        duration = int(entry["duration"])
+        day["seconds"] += duration
+        day["tasks"][entry["name"] or "Unnamed Task"] += duration / 3600
 
-    for entry in data:
-        date = datetime.strptime(entry["date"], "%Y-%m-%d")
-        required_hours = get_required_hours(date, holidays_data)
-        actual_hours = min(entry["hours"], MAX_DAILY_HOURS)
+    return days
 
-        daily_difference = actual_hours - required_hours
-        running_balance += daily_difference
 
-        status = "OK"
-        if entry["hours"] > MAX_DAILY_HOURS:
-            status = "Exceeded"
-        elif running_balance < 0:
-            status = "Warning"
+def process_timecamp_data(data, required_by_date, year, month):
+    """Enhanced data processing with running balance and status tracking
 
-        results.append(
-            {
-                "date": entry["date"],
-                "hours": actual_hours,
-                "original_hours": entry["hours"],
-                "required_hours": required_hours,
-                "daily_difference": daily_difference,
-                "running_balance": running_balance,
-                "status": status,
-                "tasks": entry["tasks"],
-                "exceeded_limit": entry["hours"] > MAX_DAILY_HOURS,
-                "hours_over_limit": max(0, entry["hours"] - MAX_DAILY_HOURS),
-            }
-        )
+    required_by_date maps "YYYY-MM-DD" to the required hours for that day.
+    """
+    MAX_DAILY_HOURS = 11.5
+    entries = pd.DataFrame(data)
+    original_hours = entries["hours"]
+
+    df = pd.DataFrame(
+        {
+            "date": entries["date"],
+            "hours": original_hours.clip(upper=MAX_DAILY_HOURS),
+            "original_hours": original_hours,
+            "required_hours": entries["date"].map(required_by_date),
+        }
+    )
+    df["daily_difference"] = df["hours"] - df["required_hours"]
+    df["running_balance"] = df["daily_difference"].cumsum()
+    df["status"] = np.select(
+        [original_hours > MAX_DAILY_HOURS, df["running_balance"] < 0],
+        ["Exceeded", "Warning"],
+        default="OK",
+    )
+    df["tasks"] = entries["tasks"]
+    df["exceeded_limit"] = original_hours > MAX_DAILY_HOURS
+    df["hours_over_limit"] = (original_hours - MAX_DAILY_HOURS).clip(lower=0)
+    # Parsed once here so the Detailed Log fragment reruns don't re-parse dates
+    df["date_dt"] = pd.to_datetime(df["date"])
+    df["day_abbr"] = df["date_dt"].dt.strftime("%a")
 
-    return pd.DataFrame(results)
+    return df
 
 
 def display_metrics(df):
@@ -282,8 +357,16 @@ def display_metrics(df):
         )
 
 
+# Chart builders are cached on their input, so reruns triggered by unrelated
+# widgets (e.g. the Detailed Log filters) reuse the already-built figures.
+# cache_resource hands back the same figure; cache_data would unpickle it,
+# which re-runs plotly's validating constructor and costs more than a rebuild.
+# Figures are only read by st.plotly_chart, never mutated.
+@st.cache_resource(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
 def create_hours_chart(df):
     """Enhanced hours visualization with better interactivity"""
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     # Add actual hours bars
@@ -292,22 +375,13 @@ def create_hours_chart(df):
             x=df["date"],
             y=df["hours"],
             name="Actual Hours",
-            marker_color=[
-                (
-                    "#10b981"
-                    if status == "OK"
-                    else "#f59e0b" if status == "Warning" else "#ef4444"
-                )
-                for status in df["status"]
-            ],
+            marker_color=df["status"].map(_COLOR_MAP).fillna("#ef4444").to_numpy(),
             hovertemplate="<b>%{x}</b><br>"
             + "Hours: %{y:.1f}<br>"
             + "Required: %{customdata[0]:.1f}<br>"
             + "Balance: %{customdata[1]:+.1f}<br>"
             + "Status: %{customdata[2]}<extra></extra>",
-            customdata=list(
-                zip(df["required_hours"], df["running_balance"], df["status"])
-            ),
+            customdata=df[["required_hours", "running_balance", "status"]].to_numpy(),
         )
     )
 
@@ -336,8 +410,178 @@ def create_hours_chart(df):
     return fig
 
 
-def main():
+@st.cache_resource(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def create_balance_chart(df):
+    """Running balance line chart, green when the month ends in credit"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(
+        go.Scatter(
+            x=df["date"],
+            y=df["running_balance"],
+            mode="lines+markers",
+            name="Running Balance",
+            line=dict(
+                color="#10b981" if df["running_balance"].iloc[-1] >= 0 else "#ef4444"
+            ),
+            hovertemplate="<b>%{x}</b><br>Balance: %{y:+.1f} hours<extra></extra>",
+        )
+    )
+    fig.update_layout(
+        title="Running Balance Over Time",
+        xaxis_title="Date",
+        yaxis_title="Hours",
+        hovermode="x unified",
+        height=300,
+        margin=dict(l=0, r=0, t=40, b=0),
+    )
+
+    return fig
+
+
+@st.cache_resource(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def create_tasks_chart(all_tasks):
+    """Task distribution donut chart from a task -> hours mapping"""
+    import plotly.graph_objects as go
 
+    fig = go.Figure(
+        data=[
+            go.Pie(
+                labels=list(all_tasks.keys()),
+                values=list(all_tasks.values()),
+                hole=0.4,
+                hovertemplate="<b>%{label}</b><br>%{value:.1f} hours<br>%{percent}<extra></extra>",
+            )
+        ]
+    )
+    fig.update_layout(
+        title="Task Distribution",
+        height=400,
+        margin=dict(l=0, r=0, t=40, b=0),
+    )
+
+    return fig
+
+
+@st.fragment
+def display_detailed_log(df):
+    """Detailed Log tab; a fragment, so its filters rerun only this tab"""
+    # Detailed daily log
+    st.subheader("Daily Time Log")
+
+    # Filters
+    col1, col2 = st.columns(2)
+    with col1:
+        status_filter = st.multiselect(
+            "Filter by Status",
+            options=["OK", "Warning", "Exceeded"],
+            default=["OK", "Warning", "Exceeded"],
+        )
+    with col2:
+        min_hours = st.slider(
+            "Minimum Hours", min_value=0.0, max_value=12.0, value=0.0, step=0.5
+        )
+
+    # Apply filters
+    filtered_df = df[(df["status"].isin(status_filter)) & (df["hours"] >= min_hours)]
+
+    # Prepare data for table display
+    table_data = []
+    for row in filtered_df.to_dict("records"):
+        table_data.append(
+            {
+                "Date": row["date"],
+                "Day": row["day_abbr"],
+                "Hours": row["hours"],
+                "Required": row["required_hours"],
+                "Difference": row["daily_difference"],
+                "Balance": row["running_balance"],
+                "Status": row["status"],
+                "Tasks": (
+                    ", ".join(
+                        f"{task} ({duration:.1f}h)"
+                        for task, duration in row["tasks"].items()
+                    )
+                    if row["tasks"]
+                    else ""
+                ),
+                "View": f"https://app.timecamp.com/app#/timesheets/timer/{row['date']}",
+            }
+        )
+
+    if table_data:
+        table_df = pd.DataFrame(table_data)
+
+        # Apply styling; the status colors are mapped for the whole
+        # column at once rather than through a per-cell function
+        styled_df = table_df.style.apply(
+            lambda col: col.map(STATUS_BACKGROUNDS).fillna(""),
+            subset=["Status"],
+        ).format(
+            {
+                "Hours": "{:.2f}",
+                "Required": "{:.2f}",
+                "Difference": "{:+.2f}",
+                "Balance": "{:+.2f}",
+            }
+        )
+
+        # Display the table
+        st.dataframe(
+            styled_df,
+            column_config={
+                "Date": st.column_config.DateColumn(
+                    "Date",
+                    width="medium",
+                ),
+                "Day": st.column_config.TextColumn(
+                    "Day",
+                    width="small",
+                ),
+                "Hours": st.column_config.NumberColumn(
+                    "Hours",
+                    format="%.2f",
+                    width="small",
+                ),
+                "Required": st.column_config.NumberColumn(
+                    "Required",
+                    format="%.2f",
+                    width="small",
+                ),
+                "Difference": st.column_config.NumberColumn(
+                    "Diff",
+                    format="%+.2f",
+                    width="small",
+                ),
+                "Balance": st.column_config.NumberColumn(
+                    "Balance",
+                    format="%+.2f",
+                    width="small",
+                ),
+                "Status": st.column_config.TextColumn(
+                    "Status",
+                    width="small",
+                ),
+                "Tasks": st.column_config.TextColumn(
+                    "Tasks",
+                    width="large",
+                ),
+                "View": st.column_config.LinkColumn(
+                    "View",
+                    width="small",
+                    display_text="View",
+                ),
+            },
+            use_container_width=True,
+            hide_index=True,
+        )
+    else:
+        st.info("No data matching the selected filters")
+
+
+def main():
+    _inject_css()
     init_session_state()
 
     if not check_authentication():
@@ -433,31 +677,40 @@ def main():
                             for i in range((last_day - first_day).days + 1)
                         ]
 
-                        # Get holidays
+                        # Get holidays and each day's required hours, once
                         il_holidays = get_israeli_holidays(year)
+                        required_by_date = {
+                            date.strftime("%Y-%m-%d"): get_required_hours(
+                                date, il_holidays
+                            )
+                            for date in date_range
+                        }
 
-                        # Collect all data
+                        # Fetch the whole month at once, then collect workdays
+                        month_entries = get_month_entries(
+                            get_timecamp_session(), api_key, first_day, last_day
+                        )
                         results = []
-                        for date in date_range:
-                            required_hours = get_required_hours(date, il_holidays)
-                            if required_hours > 0:  # Only fetch if work is required
-                                hours, tasks_dict = get_work_hours_and_tasks(
-                                    api_key, date
+                        if month_entries is not None:  # Check if fetch was successful
+                            for date_str, required_hours in required_by_date.items():
+                                if required_hours == 0:  # Skip non-working days
+                                    continue
+                                day = month_entries.get(date_str)
+                                seconds = day["seconds"] if day else 0
+                                results.append(
+                                    {
+                                        "date": date_str,
+                                        # Cap at 11.5 hours like the extension
+                                        "hours": min(seconds, 11.5 * 3600) / 3600,
+                                        "tasks": dict(day["tasks"]) if day else {},
+                                        "required_hours": required_hours,
+                                    }
                                 )
-                                if hours is not None:  # Check if fetch was successful
-                                    results.append(
-                                        {
-                                            "date": date.strftime("%Y-%m-%d"),
-                                            "hours": hours,
-                                            "tasks": tasks_dict,
-                                            "required_hours": required_hours,
-                                        }
-                                    )
 
                         if results:
                             # Process the data
                             df = process_timecamp_data(
-                                results, il_holidays, year, month
+                                results, required_by_date, year, month
                             )
                             st.session_state.last_fetch_data = df
                             st.session_state.last_fetch_time = datetime.now()
@@ -482,8 +735,11 @@ def main():
         holidays_df = df[df["required_hours"] == 0].copy()
         if not holidays_df.empty:
             with st.expander("Holidays and Non-Working Days", expanded=False):
-                for _, row in holidays_df.iterrows():
-                    st.markdown(f"🗓️ **{row['date']}**: Non-working day")
+                st.markdown(
+                    "\n\n".join(
+                        f"🗓️ **{date}**: Non-working day" for date in holidays_df["date"]
+                    )
+                )
 
         # Display metrics
         display_metrics(df)
@@ -496,71 +752,28 @@ def main():
             st.plotly_chart(create_hours_chart(df), use_container_width=True)
 
             # Running balance chart
-            fig_balance = go.Figure()
-            fig_balance.add_trace(
-                go.Scatter(
-                    x=df["date"],
-                    y=df["running_balance"],
-                    mode="lines+markers",
-                    name="Running Balance",
-                    line=dict(
-                        color=(
-                            "#10b981"
-                            if df["running_balance"].iloc[-1] >= 0
-                            else "#ef4444"
-                        )
-                    ),
-                    hovertemplate="<b>%{x}</b><br>Balance: %{y:+.1f} hours<extra></extra>",
-                )
-            )
-            fig_balance.update_layout(
-                title="Running Balance Over Time",
-                xaxis_title="Date",
-                yaxis_title="Hours",
-                hovermode="x unified",
-                height=300,
-                margin=dict(l=0, r=0, t=40, b=0),
-            )
-            st.plotly_chart(fig_balance, use_container_width=True)
+            st.plotly_chart(create_balance_chart(df), use_container_width=True)
 
         with tab2:
             # Aggregate tasks across all days
-            all_tasks = {}
-            for idx, row in df.iterrows():
-                for task, duration in row["tasks"].items():
-                    all_tasks[task] = all_tasks.get(task, 0) + duration
+            all_tasks = Counter()
+            for tasks in df["tasks"]:
+                all_tasks.update(tasks)
 
             if all_tasks:
                 # Create task distribution pie chart
-                fig_tasks = go.Figure(
-                    data=[
-                        go.Pie(
-                            labels=list(all_tasks.keys()),
-                            values=list(all_tasks.values()),
-                            hole=0.4,
-                            hovertemplate="<b>%{label}</b><br>%{value:.1f} hours<br>%{percent}<extra></extra>",
-                        )
-                    ]
-                )
-                fig_tasks.update_layout(
-                    title="Task Distribution",
-                    height=400,
-                    margin=dict(l=0, r=0, t=40, b=0),
+                st.plotly_chart(
+                    create_tasks_chart(dict(all_tasks)), use_container_width=True
                 )
-                st.plotly_chart(fig_tasks, use_container_width=True)
 
                 # Task breakdown table
                 st.subheader("Task Breakdown")
+                total_hours = sum(all_tasks.values()) or 1.0
                 task_df = pd.DataFrame(
-                    [
-                        {
-                            "Task": task,
-                            "Hours": hours,
-                            "Percentage": (hours / sum(all_tasks.values())) * 100,
-                        }
-                        for task, hours in all_tasks.items()
-                    ]
-                ).sort_values("Hours", ascending=False)
+                    {"Task": list(all_tasks.keys()), "Hours": list(all_tasks.values())}
+                )
+                task_df["Percentage"] = task_df["Hours"] / total_hours * 100
+                task_df = task_df.sort_values("Hours", ascending=False)
 
                 st.dataframe(
                     task_df.style.format({"Hours": "{:.1f}", "Percentage": "{:.1f}%"}),
@@ -569,153 +782,7 @@ def main():
                 )
 
         with tab3:
-            # Detailed daily log
-            st.subheader("Daily Time Log")
-
-            # Filters
-            col1, col2 = st.columns(2)
-            with col1:
-                status_filter = st.multiselect(
-                    "Filter by Status",
-                    options=["OK", "Warning", "Exceeded"],
-                    default=["OK", "Warning", "Exceeded"],
-                )
-            with col2:
-                min_hours = st.slider(
-                    "Minimum Hours", min_value=0.0, max_value=12.0, value=0.0, step=0.5
-                )
-
-            # Apply filters
-            filtered_df = df[
-                (df["status"].isin(status_filter)) & (df["hours"] >= min_hours)
-            ].copy()
-
-            # Prepare data for table display
-            table_data = []
-            for _, row in filtered_df.iterrows():
-                date_obj = datetime.strptime(row["date"], "%Y-%m-%d")
-                table_data.append(
-                    {
-                        "Date": row["date"],
-                        "Day": date_obj.strftime("%a"),
-                        "Hours": row["hours"],
-                        "Required": row["required_hours"],
-                        "Difference": row["daily_difference"],
-                        "Balance": row["running_balance"],
-                        "Status": row["status"],
-                        "Tasks": (
-                            ", ".join(
-                                f"{task} ({duration:.1f}h)"
-                                for task, duration in row["tasks"].items()
-                            )
-                            if row["tasks"]
-                            else ""
-                        ),
-                        "View": f"https://app.timecamp.com/app#/timesheets/timer/{row['date']}",
-                    }
-                )
-
-            if table_data:
-                table_df = pd.DataFrame(table_data)
-
-                # Define style function for background colors
-                def color_status(val):
-                    if val == "Warning":
-                        return "background-color: #fef9c3"
-                    elif val == "Exceeded":
-                        return "background-color: #fee2e2"
-                    elif val == "OK":
-                        return "background-color: #dcfce7"
-                    return ""
-
-                # Apply styling
-                styled_df = table_df.style.apply(
-                    lambda x: [color_status(v) for v in x], subset=["Status"]
-                ).format(
-                    {
-                        "Hours": "{:.2f}",
-                        "Required": "{:.2f}",
-                        "Difference": "{:+.2f}",
-                        "Balance": "{:+.2f}",
-                    }
-                )
-
-                # Add custom CSS for the table
-                st.markdown(
-                    """
-                <style>
-                    .stDataFrame {
-                        font-size: 14px;
-                    }
-                    .stDataFrame td {
-                        white-space: nowrap;
-                        overflow: hidden;
-                        text-overflow: ellipsis;
-                        max-width: 150px;
-                    }
-                    .stDataFrame td a {
-                        color: #1a56db;
-                        text-decoration: none;
-                    }
-                    .stDataFrame td a:hover {
-                        text-decoration: underline;
-                    }
-                </style>
-                """,
-                    unsafe_allow_html=True,
-                )
-
-                # Display the table
-                st.dataframe(
-                    styled_df,
-                    column_config={
-                        "Date": st.column_config.DateColumn(
-                            "Date",
-                            width="medium",
-                        ),
-                        "Day": st.column_config.TextColumn(
-                            "Day",
-                            width="small",
-                        ),
-                        "Hours": st.column_config.NumberColumn(
-                            "Hours",
-                            format="%.2f",
-                            width="small",
-                        ),
-                        "Required": st.column_config.NumberColumn(
-                            "Required",
-                            format="%.2f",
-                            width="small",
-                        ),
-                        "Difference": st.column_config.NumberColumn(
-                            "Diff",
-                            format="%+.2f",
-                            width="small",
-                        ),
-                        "Balance": st.column_config.NumberColumn(
-                            "Balance",
-                            format="%+.2f",
-                            width="small",
-                        ),
-                        "Status": st.column_config.TextColumn(
-                            "Status",
-                            width="small",
-                        ),
-                        "Tasks": st.column_config.TextColumn(
-                            "Tasks",
-                            width="large",
-                        ),
-                        "View": st.column_config.LinkColumn(
-                            "View",
-                            width="small",
-                            display_text="View",
-                        ),
-                    },
-                    use_container_width=True,
-                    hide_index=True,
-                )
-            else:
-                st.info("No data matching the selected filters")
+            display_detailed_log(df)
 
     else:
         # Show instructions for first-time users
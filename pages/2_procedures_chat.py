@@ -1,9 +1,7 @@
-from utils.database import init_mongodb, find_similar_chunks
-from utils.ai_services import (
-    get_embedding,
-    get_gemini_response,
-    process_gemini_response,
-)
+# utils.database, utils.ai_services and utils.embedding_cache pull in pymongo,
+# numpy and the Gemini SDKs, so they are imported inside the functions that
+# need them; unauthenticated visitors are redirected before paying for them
+from utils.concurrency import executor
 from utils.ui_components import (
     setup_page_config,
     add_custom_css,
@@ -14,6 +12,8 @@ from utils.ui_components import (
 )
 from utils.display_utils import display_chunk_content
 import streamlit as st
+import hashlib
+import time
 
 # from dotenv import load_dotenv
 import os
@@ -21,9 +21,46 @@ import os
 # Load environment variables
 # load_dotenv()
 
+EXAMPLE_QUESTIONS = [
+    "מהו תהליך קליטת עובד חדש?",
+    "מה נוהל החזר הוצאות?",
+    "איך מגישים בקשה לחופשה?",
+    "מהם שעות העבודה הגמישות?",
+]
+
+# Streaming responses are re-rendered at most this often; once chunks pile up
+# faster than they are flushed, fall back to a coarser cadence
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
+STREAM_BACKLOG_INTERVAL = 0.2  # seconds
+STREAM_BACKLOG_CHUNKS = 32
+
+# Example results are re-primed this often; matches the search cache TTL in
+# utils.database, which isn't imported here to keep page load light
+EXAMPLE_WARM_TTL = 3600  # seconds
+
+# Fallback for chunks without page numbers, shared instead of a per-call list
+_DEFAULT_PAGES = ("לא ידוע",)
+
+
+def _mk_source(chunk):
+    """Build the stored source entry for a chunk cited in an answer"""
+    return {
+        "filename": chunk["metadata"]["filename"],
+        "page": (chunk.get("pages") or _DEFAULT_PAGES)[0],
+        "content": chunk["chunk_text"],
+    }
+
 
 def process_query(question, collection):
     """Process a query and return response with all necessary updates to the UI"""
+    from utils.ai_services import (
+        get_gemini_response,
+        process_gemini_response,
+        warm_gemini_session,
+    )
+    from utils.database import find_similar_chunks
+    from utils.embedding_cache import get_embedder
+
     # Ensure examples are hidden when processing any query
     st.session_state.show_examples = False
     # Add to conversation history
@@ -36,7 +73,10 @@ def process_query(question, collection):
     # Show assistant message and perform query
     with st.chat_message("assistant"):
         with st.spinner("מחפש בנהלים..."):
-            query_embedding = get_embedding(question)
+            # Warm the Gemini connection while the question is being embedded
+            embedding_future = executor.submit(get_embedder().embed, question)
+            executor.submit(warm_gemini_session)
+            query_embedding = embedding_future.result()
             similar_chunks = find_similar_chunks(collection, query_embedding, question)
 
             if not similar_chunks:
@@ -48,12 +88,30 @@ def process_query(question, collection):
                 response_placeholder = st.empty()
                 complete_response = ""
 
-                # Get and display streaming response
+                # Get and display streaming response, coalescing chunks so the
+                # placeholder is not re-rendered for every single token
+                last_flush = time.monotonic()
+                pending_chunks = 0
                 for chunk in get_gemini_response(
                     question, similar_chunks, st.session_state.conversation_history
                 ):
                     complete_response += chunk
-                    # Update the placeholder with accumulated response
+                    pending_chunks += 1
+                    now = time.monotonic()
+                    flush_interval = (
+                        STREAM_BACKLOG_INTERVAL
+                        if pending_chunks > STREAM_BACKLOG_CHUNKS
+                        else STREAM_FLUSH_INTERVAL
+                    )
+                    if now - last_flush >= flush_interval:
+                        response_placeholder.markdown(
+                            format_message(complete_response), unsafe_allow_html=True
+                        )
+                        last_flush = now
+                        pending_chunks = 0
+
+                # Flush whatever arrived after the last update
+                if pending_chunks:
                     response_placeholder.markdown(
                         format_message(complete_response), unsafe_allow_html=True
                     )
@@ -63,38 +121,88 @@ def process_query(question, collection):
                     complete_response, similar_chunks
                 )
 
+            sources = [_mk_source(chunk) for chunk in used_chunks]
+
             if used_chunks:
                 with st.expander("📚 מקורות"):
-                    for chunk in used_chunks:
-                        st.markdown(
-                            f"**{chunk['metadata']['filename']}** (עמוד {chunk.get('pages', ['לא ידוע'])[0]})"
-                        )
+                    for chunk, source in zip(used_chunks, sources):
+                        st.markdown(f"**{source['filename']}** (עמוד {source['page']})")
                         display_chunk_content(chunk)
 
             st.session_state.conversation_history.append(
                 {
                     "role": "assistant",
                     "content": response_text,
-                    "sources": [
-                        {
-                            "filename": chunk["metadata"]["filename"],
-                            "page": chunk.get("pages", ["לא ידוע"])[0],
-                            "content": chunk["chunk_text"],
-                        }
-                        for chunk in used_chunks
-                    ],
+                    "sources": sources,
+                    # Formatted once here rather than on every history replay
+                    "_source_keys": cache_source_markdown(sources),
                 }
             )
 
 
-def create_example_questions(collection):
-    example_questions = [
-        "מהו תהליך קליטת עובד חדש?",
-        "מה נוהל החזר הוצאות?",
-        "איך מגישים בקשה לחופשה?",
-        "מהם שעות העבודה הגמישות?",
-    ]
+def cache_source_markdown(sources):
+    """Render each source to markdown once per session and return cache keys"""
+    source_md_cache = st.session_state.source_md_cache
+    keys = []
+    for source in sources:
+        key = (
+            source["filename"],
+            str(source["page"]),
+            hashlib.md5(source["content"].encode("utf-8")).hexdigest(),
+        )
+        if key not in source_md_cache:
+            source_md_cache[key] = (
+                f"**{source['filename']}** (עמוד {source['page']})\n\n"
+                f"{source['content']}"
+            )
+        keys.append(key)
+    return keys
 
+
+def display_conversation_history():
+    """Replay the conversation so far using the cached source markdown"""
+    source_md_cache = st.session_state.source_md_cache
+    with st.container():
+        for message in st.session_state.conversation_history:
+            with st.chat_message(message["role"]):
+                if message["role"] == "assistant" and "sources" in message:
+                    st.markdown(message["content"])
+                    with st.expander("📚 מקורות"):
+                        for key in message["_source_keys"]:
+                            st.markdown(source_md_cache[key])
+                else:
+                    st.markdown(message["content"])
+
+
+@st.cache_resource(ttl=EXAMPLE_WARM_TTL, show_spinner=False)
+def warm_example_retrievals(_collection):
+    """Prime the example questions' embeddings and search results in background
+
+    Expires with the search cache, so the next page load after that re-primes
+    the results; page rendering never waits on it.
+    """
+    executor.submit(_warm_example_retrievals, _collection)
+
+
+def _warm_example_retrievals(collection):
+    """Embed the example questions in one batch and search them concurrently"""
+    from utils.database import find_similar_chunks_batch
+    from utils.embedding_cache import get_embedder
+
+    embedder = get_embedder()
+    try:
+        embedder.warmup(EXAMPLE_QUESTIONS)
+    except Exception as e:
+        print(f"Error warming example questions: {e}")
+        return
+
+    find_similar_chunks_batch(
+        collection,
+        [(embedder.embed(question), question) for question in EXAMPLE_QUESTIONS],
+    )
+
+
+def create_example_questions(collection):
     st.write("")
     st.markdown("##### שאלות לדוגמה:")
 
@@ -104,7 +212,7 @@ def create_example_questions(collection):
 
     cols = st.columns(2)
 
-    for idx, question in enumerate(example_questions):
+    for idx, question in enumerate(EXAMPLE_QUESTIONS):
         with cols[idx % 2]:
             if st.button(question, key=f"example_q_{idx}", use_container_width=True):
                 st.session_state.clicked_question = question
@@ -115,8 +223,9 @@ def create_example_questions(collection):
     if st.session_state.clicked_question:
         question = st.session_state.clicked_question
         st.session_state.clicked_question = None  # Reset for next time
+        # process_query renders the exchange live; the example buttons are
+        # hidden on the next natural rerun without forcing one here
         process_query(question, collection)
-        st.rerun()
 
 
 def main():
@@ -129,24 +238,17 @@ def main():
         st.warning("Please log in to access this page.")
         redirect_page()
 
+    from utils.database import init_mongodb
+
     st.title("📚 צ'אטבוט נהלי קמביום")
     collection = init_mongodb()
+    warm_example_retrievals(collection)
 
     # Initialize show_examples in init_session_state instead
     if "show_examples" not in st.session_state:
         st.session_state.show_examples = True
 
-    # Display conversation history
-    for message in st.session_state.conversation_history:
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant" and "sources" in message:
-                st.markdown(message["content"])
-                with st.expander("📚 מקורות"):
-                    for source in message["sources"]:
-                        st.markdown(f"**{source['filename']}** (עמוד {source['page']})")
-                        st.markdown(source["content"])
-            else:
-                st.markdown(message["content"])
+    display_conversation_history()
 
     # Show example questions only if there's no conversation history
     if st.session_state.show_examples and not st.session_state.conversation_history:
@@ -155,7 +257,6 @@ def main():
     # Chat input
     if question := st.chat_input("שאל שאלה על נהלי קמביום..."):
         process_query(question, collection)
-        st.rerun()  # Force a rerun to update the UI immediately
 
 
 if __name__ == "__main__":
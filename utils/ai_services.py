@@ -3,7 +3,6 @@
 from google import genai
 import google.generativeai as genaiEmb
 from typing import List, Dict, Tuple, Generator
-import streamlit as st
 import re
 
 # from dotenv import load_dotenv
@@ -11,15 +10,22 @@ import os
 import json
 from datetime import datetime
 from google.genai.types import GenerateContentResponse, GenerateContentConfig
+from utils.env import SECRETS
 
 # Load environment variables
 # load_dotenv()
 
 # Configure API clients
-genaiEmb.configure(api_key=st.secrets["GEMINI_API_KEY"])
-client = genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
+genaiEmb.configure(api_key=SECRETS["GEMINI_API_KEY"])
+client = genai.Client(api_key=SECRETS["GEMINI_API_KEY"])
 MODEL_ID = "gemini-2.0-flash-exp"  # or your specific model ID
 
+# Per-chunk cap on context text sent to Gemini; input tokens drive latency
+MAX_CHUNK_CHARS = 4000
+
+# Source citations like [3] in the model's answer
+_SOURCE_RE = re.compile(r"\[(\d+)\]")
+
 
 def get_embedding(text: str) -> List[float]:
     """Get text embedding using Gemini"""
@@ -29,16 +35,30 @@ def get_embedding(text: str) -> List[float]:
     return result["embedding"]
 
 
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embeddings for several texts in a single Gemini request"""
+    result = genaiEmb.embed_content(
+        model="models/text-embedding-004", content=texts, task_type="retrieval_query"
+    )
+    return result["embedding"]
+
+
+def warm_gemini_session():
+    """Open the Gemini connection ahead of the streamed request"""
+    try:
+        client.models.get(model=MODEL_ID)
+    except Exception as e:
+        print(f"Error warming Gemini session: {e}")
+
+
 def get_gemini_response(
     question: str, chunks: List[Dict], history: List[Dict]
 ) -> Generator[str, None, None]:
     """Get streaming response from Gemini model"""
-    context_texts = [
-        f"""[{i}] מתוך {chunk['metadata']['filename']} (עמוד {chunk.get('pages', ['לא ידוע'])[0]}):\n{chunk['chunk_text']}"""
+    context = "\n\n".join(
+        f"""[{i}] מתוך {chunk['metadata']['filename']} (עמוד {chunk.get('pages', ['לא ידוע'])[0]}):\n{chunk['chunk_text'][:MAX_CHUNK_CHARS]}"""
         for i, chunk in enumerate(chunks, 1)
-    ]
-
-    context = "\n\n".join(context_texts)
+    )
     prompt = create_gemini_prompt(question, context)
 
     try:
@@ -50,13 +70,12 @@ def get_gemini_response(
             ),
         )
 
+        # Stream chunks almost always carry .text; only probe the rare others
         for chunk in response:
-            if hasattr(chunk, "text"):
+            try:
                 yield chunk.text
-            elif isinstance(chunk, tuple):
-                yield str(chunk[0])
-            else:
-                yield str(chunk)
+            except AttributeError:
+                yield str(chunk[0]) if isinstance(chunk, tuple) else str(chunk)
 
     except Exception as e:
         print(f"Error generating response: {e}")
@@ -67,10 +86,12 @@ def process_gemini_response(
     response_text: str, chunks: List[Dict]
 ) -> Tuple[str, List[Dict]]:
     """Process the complete Gemini response to extract used sources"""
-    used_source_numbers = set(re.findall(r"\[(\d+)\]", response_text))
-    used_chunks = [
-        chunks[int(num) - 1] for num in used_source_numbers if int(num) <= len(chunks)
-    ]
+    used_source_numbers = {
+        num
+        for num in map(int, _SOURCE_RE.findall(response_text))
+        if 1 <= num <= len(chunks)
+    }
+    used_chunks = [chunks[num - 1] for num in sorted(used_source_numbers)]
     return response_text, used_chunks
 
 
@@ -0,0 +1,6 @@
+"""Shared thread pool for overlapping network-bound work"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Module-level so the pool (and its threads) outlive Streamlit reruns
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cambium")
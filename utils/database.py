@@ -1,8 +1,19 @@
 """MongoDB database operations"""
 
+import copy
+import hashlib
+import json
+from bson.binary import Binary, BinaryVectorDtype
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from pymongo.operations import SearchIndexModel
+import numpy as np
 import streamlit as st
-from typing import List, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import List, Dict, Tuple, Union
+from utils.env import SECRETS
 
 # from dotenv import load_dotenv
 import os
@@ -10,129 +21,494 @@ import os
 # Load environment variables
 # load_dotenv()
 
+VECTOR_INDEX = "vector_index"
+TEXT_INDEX = "text_index"
+EMBEDDING_DIMENSIONS = 768  # models/text-embedding-004
+VECTOR_QUANTIZATION = "scalar"
+# Seconds a cached hybrid search result is reused
+SEARCH_CACHE_TTL = 3600
+# Candidates explored per requested result, within Atlas's numCandidates cap
+CANDIDATES_PER_RESULT = 15
+MAX_NUM_CANDIDATES = 10_000
+# Below this many chunks a flat scan beats HNSW traversal, and is exact
+EXACT_SEARCH_THRESHOLD = 10_000
+# Filter fields indexed for the $vectorSearch prefilter; conditions on any
+# other field are applied with a $match after the vector search instead
+VECTOR_FILTER_PATHS = ("metadata.filename",)
+# Relative weight of each branch in $rankFusion
+FUSION_WEIGHTS = {"vector": 0.5, "text": 0.5}
+# Server error for "Unrecognized pipeline stage name", returned for
+# $rankFusion by deployments older than MongoDB 8.x; the only failure that
+# makes hybrid search fall back to the $unionWith pipeline
+UNRECOGNIZED_STAGE_CODE = 40324
+# Pipeline stages found unsupported by the server, skipped for the process
+_unsupported_stages = set()
+# Per-branch scores kept at their maximum when a chunk matches both branches
+_SCORE_FIELDS = ("search_score", "vector_score", "text_score")
 
+SEARCH_INDEX_DEFINITIONS = {
+    VECTOR_INDEX: {
+        "type": "vectorSearch",
+        "definition": {
+            "fields": [
+                {
+                    "type": "vector",
+                    "path": "embedding",
+                    "numDimensions": EMBEDDING_DIMENSIONS,
+                    "similarity": "cosine",
+                    # int8 scalar quantization: 4x fewer bytes per comparison
+                    "quantization": VECTOR_QUANTIZATION,
+                },
+                # Fields usable in the $vectorSearch prefilter
+                *({"type": "filter", "path": path} for path in VECTOR_FILTER_PATHS),
+            ]
+        },
+    },
+    # text_index is managed in Atlas (custom mappings and analyzers); the app
+    # never creates or changes it
+}
+
+# Opt-in: apply VECTOR_QUANTIZATION to an existing vector_index at startup.
+# Leaves every other setting of the live index untouched; Atlas rebuilds it.
+UPDATE_VECTOR_QUANTIZATION = os.environ.get("CAMBIUM_UPDATE_VECTOR_QUANTIZATION") == "1"
+
+
+@st.cache_resource
+def _get_client() -> MongoClient:
+    """Process-wide MongoClient, so its pool keeps TLS connections warm"""
+    # zstd comes from the pymongo[zstd] extra; zlib is the stdlib fallback
+    return MongoClient(SECRETS["MONGODB_URI"], maxPoolSize=50, compressors="zstd,zlib")
+
+
+@st.cache_resource
 def init_mongodb():
-    """Initialize MongoDB connection"""
-    client = MongoClient(st.secrets["MONGODB_URI"])
-    return client["cambium-procedures"].document_chunks
+    """Initialize MongoDB connection, shared across reruns and sessions"""
+    collection = _get_client()["cambium-procedures"].document_chunks
+    ensure_search_indexes(collection)
+    threading.Thread(
+        target=_watch_chunk_changes,
+        args=(collection,),
+        name="chunk-change-watcher",
+        daemon=True,
+    ).start()
+    return collection
+
+
+def _watch_chunk_changes(collection):
+    """Drop cached search results whenever the chunks collection changes"""
+    pipeline = [
+        {
+            "$match": {
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+            }
+        }
+    ]
+    try:
+        with collection.watch(pipeline) as stream:
+            for _ in stream:
+                _cached_hybrid_search.clear()
+                _chunk_count.clear()
+    except Exception as e:
+        print(f"Change stream error: {e}")
+
+
+def ensure_search_indexes(collection):
+    """Create the vector index used by find_similar_chunks if it is missing
+
+    Existing indexes are left alone, unless UPDATE_VECTOR_QUANTIZATION opts in
+    to changing the quantization of vector_index.
+    """
+    try:
+        existing = {index["name"]: index for index in collection.list_search_indexes()}
+        missing = [
+            SearchIndexModel(
+                definition=spec["definition"], name=name, type=spec["type"]
+            )
+            for name, spec in SEARCH_INDEX_DEFINITIONS.items()
+            if name not in existing
+        ]
+        if missing:
+            collection.create_search_indexes(missing)
+
+        if UPDATE_VECTOR_QUANTIZATION and VECTOR_INDEX in existing:
+            _update_vector_quantization(collection, existing[VECTOR_INDEX])
+    except Exception as e:
+        print(f"Search index error: {e}")
+
+
+def _update_vector_quantization(collection, index: Dict):
+    """Set VECTOR_QUANTIZATION on the live index's vector fields, if different"""
+    definition = copy.deepcopy(index.get("latestDefinition", {}))
+    vector_fields = [
+        field
+        for field in definition.get("fields", [])
+        if field.get("type") == "vector"
+    ]
+    if not vector_fields or all(
+        field.get("quantization") == VECTOR_QUANTIZATION for field in vector_fields
+    ):
+        return
+
+    for field in vector_fields:
+        field["quantization"] = VECTOR_QUANTIZATION
+    collection.update_search_index(VECTOR_INDEX, definition)
 
 
 def find_similar_chunks(
     collection,
-    query_embedding: List[float],
+    query_embedding: Union[List[float], np.ndarray],
     query_text: str,
     search_params: Dict = None,
 ) -> List[Dict]:
     """
     Hybrid search function combining vector and text search
 
+    Results are cached by a digest of the float32 query embedding and the
+    canonical JSON of search_params, so a repeated question skips both
+    aggregation round trips without hashing the full vector on every lookup.
+
     Args:
         collection: MongoDB collection
         query_embedding: Vector embedding of the query
         query_text: Original query text
         search_params: Dictionary containing search parameters like filters, sort, limit
+            and an optional numCandidates override for the vector branch; set
+            include_embedding to get the stored embedding back with each chunk,
+            or exact to choose exact (True) or approximate (False) vector search
     """
     if not search_params:
         search_params = {"limit": 100}
 
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
     try:
-        # Vector search pipeline
-        vector_pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "vector_index",
-                    "path": "embedding",
-                    "queryVector": query_embedding,
-                    "numCandidates": 100,
-                    "limit": search_params.get("limit", 100),
-                }
-            },
-            {
-                "$addFields": {
-                    "search_score": {"$meta": "vectorSearchScore"},
-                    "vector_score": {"$meta": "vectorSearchScore"},
-                    "text_score": {"$literal": 0},
-                }
-            },
-        ]
+        return _cached_hybrid_search(
+            collection,
+            query_embedding,
+            search_params,
+            hashlib.blake2b(query_embedding.tobytes(), digest_size=16).hexdigest(),
+            query_text,
+            json.dumps(search_params, sort_keys=True, default=str),
+        )
+    except Exception as e:
+        print(f"Search error: {e}")
+        return []
 
-        # Add filters if specified
-        if "filter" in search_params:
-            vector_pipeline.insert(1, {"$match": search_params["filter"]})
-
-        # Add sorting if specified
-        if "sort" in search_params:
-            vector_pipeline.append({"$sort": dict(search_params["sort"])})
-
-        vector_results = list(collection.aggregate(vector_pipeline))
-
-        # Text search with the same parameters
-        text_query = query_text
-        if "additional_terms" in search_params:
-            text_query = f"{text_query} {' '.join(search_params['additional_terms'])}"
-
-        text_pipeline = [
-            {
-                "$search": {
-                    "index": "text_index",
-                    "text": {
-                        "query": text_query,
-                        "path": {"wildcard": "*"},
-                        "score": {"boost": {"value": 0.9}},
-                    },
-                }
-            },
-            {
-                "$addFields": {
-                    "search_score": {"$meta": "searchScore"},
-                    "vector_score": {"$literal": 0},
-                    "text_score": {"$meta": "searchScore"},
-                }
-            },
-        ]
 
-        # Add filters if specified
-        if "filter" in search_params:
-            text_pipeline.insert(1, {"$match": search_params["filter"]})
-
-        # Add sorting and limit if specified
-        if "sort" in search_params:
-            text_pipeline.append({"$sort": dict(search_params["sort"])})
-        if "limit" in search_params:
-            text_pipeline.append({"$limit": search_params["limit"]})
-
-        text_results = list(collection.aggregate(text_pipeline))
-
-        # Combine and deduplicate results
-        all_results = vector_results + text_results
-
-        # Group by chunk ID and take highest score
-        grouped_results = {}
-        for result in all_results:
-            chunk_id = result["_id"]
-            if (
-                chunk_id not in grouped_results
-                or result["search_score"] > grouped_results[chunk_id]["search_score"]
-            ):
-                grouped_results[chunk_id] = result
-
-        # Convert back to list and sort
-        final_results = list(grouped_results.values())
-
-        # Apply final sorting
-        if "sort" in search_params:
-            sort_field = search_params["sort"][0][0]
-            sort_direction = search_params["sort"][0][1]
-            final_results.sort(
-                key=lambda x: x[sort_field], reverse=sort_direction == -1
+def find_similar_chunks_batch(
+    collection,
+    queries: List[Tuple[Union[List[float], np.ndarray], str]],
+    search_params: Dict = None,
+) -> List[List[Dict]]:
+    """
+    Run several hybrid searches side by side, e.g. for expanded sub-queries
+
+    $facet sub-pipelines can't contain $vectorSearch or $search, so each query
+    keeps its own pipeline and the round trips overlap on a thread pool.
+
+    Args:
+        collection: MongoDB collection
+        queries: (query_embedding, query_text) pairs
+        search_params: Search parameters shared by every query
+
+    Returns:
+        One result list per query, in the order given
+    """
+    # None when called from a background thread, which is fine for the cache
+    ctx = get_script_run_ctx(suppress_warning=True)
+
+    def search(query):
+        # Lets st.cache_data inside find_similar_chunks see the session
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return find_similar_chunks(collection, *query, search_params)
+
+    # A private pool sized to the batch, so it never queues behind other work
+    with ThreadPoolExecutor(max_workers=max(len(queries), 1)) as pool:
+        return list(pool.map(search, queries))
+
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, max_entries=512, show_spinner=False)
+def _cached_hybrid_search(
+    _collection,
+    _query_embedding: np.ndarray,
+    _search_params: Dict,
+    embedding_key: str,
+    query_text: str,
+    params_key: str,
+) -> List[Dict]:
+    """Cached wrapper around _hybrid_search; failures raise and are not cached
+
+    Only the three key arguments are hashed; the underscored ones they
+    describe are passed through untouched.
+    """
+    # A packed float32 BSON vector is a quarter the size of an array of doubles
+    query_vector = Binary.from_vector(
+        _query_embedding.tolist(), BinaryVectorDtype.FLOAT32
+    )
+    return _hybrid_search(_collection, query_vector, query_text, _search_params)
+
+
+def _hybrid_search(
+    collection, query_embedding: Binary, query_text: str, search_params: Dict
+) -> List[Dict]:
+    """Run the vector and text searches as one fused server-side pipeline
+
+    Results are fused with $rankFusion. Deployments that don't recognize it
+    (before 8.x) get one $unionWith pipeline merged by _merge_stages instead;
+    that is remembered for the process, so later queries skip straight to it.
+    Any other error is raised as is.
+    """
+    if "exact" not in search_params:
+        search_params = {**search_params, "exact": _use_exact_search(collection)}
+
+    if "$rankFusion" not in _unsupported_stages:
+        try:
+            return list(
+                collection.aggregate(
+                    _rank_fusion_pipeline(query_embedding, query_text, search_params)
+                )
             )
+        except OperationFailure as e:
+            _mark_unsupported("$rankFusion", e)
 
-        # Apply final limit
-        if "limit" in search_params:
-            final_results = final_results[: search_params["limit"]]
+    text_pipeline = _text_pipeline(query_text, search_params)
+    union = {"$unionWith": {"coll": collection.name, "pipeline": text_pipeline}}
+    return list(
+        collection.aggregate(
+            _vector_pipeline(query_embedding, search_params)
+            + [union]
+            + _merge_stages(search_params)
+        )
+    )
 
-        return final_results
 
+def _mark_unsupported(stage: str, error: OperationFailure):
+    """Record stage as unavailable on this server, or re-raise other errors"""
+    if error.code != UNRECOGNIZED_STAGE_CODE:
+        raise error
+    print(f"{stage} is not supported by this deployment, falling back: {error}")
+    _unsupported_stages.add(stage)
+
+
+def _use_exact_search(collection) -> bool:
+    """Whether the collection is small enough for exact (flat) vector search"""
+    try:
+        return _chunk_count(collection) < EXACT_SEARCH_THRESHOLD
     except Exception as e:
-        print(f"Search error: {e}")
-        return []
+        print(f"Chunk count error: {e}")
+        return False
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _chunk_count(_collection) -> int:
+    """Cached estimate of the number of chunks"""
+    return _collection.estimated_document_count()
+
+
+def _vector_stage(query_embedding: Binary, search_params: Dict) -> Dict:
+    """Build the $vectorSearch stage shared by all hybrid search pipelines
+
+    numCandidates scales with the limit unless search_params overrides it;
+    exact search scans every vector and takes no numCandidates.
+    """
+    limit = search_params.get("limit", 100)
+    stage = {
+        "index": VECTOR_INDEX,
+        "path": "embedding",
+        "queryVector": query_embedding,
+        "limit": limit,
+    }
+    if search_params.get("exact"):
+        stage["exact"] = True
+    else:
+        stage["numCandidates"] = search_params.get(
+            "numCandidates",
+            min(max(limit * CANDIDATES_PER_RESULT, 100), MAX_NUM_CANDIDATES),
+        )
+
+    # Prefilter inside the index so candidates are drawn from matches only
+    prefilter, _ = _split_filter(search_params)
+    if prefilter:
+        stage["filter"] = prefilter
+
+    return {"$vectorSearch": stage}
+
+
+def _text_stage(query_text: str, search_params: Dict) -> Dict:
+    """Build the $search stage shared by all hybrid search pipelines"""
+    text_query = query_text
+    if "additional_terms" in search_params:
+        text_query = f"{text_query} {' '.join(search_params['additional_terms'])}"
+
+    return {
+        "$search": {
+            "index": TEXT_INDEX,
+            "text": {
+                "query": text_query,
+                "path": {"wildcard": "*"},
+                "score": {"boost": {"value": 0.9}},
+            },
+        }
+    }
+
+
+def _exclude_stages(search_params: Dict, *fields: str) -> List[Dict]:
+    """$project dropping fields and, unless asked for, the stored embedding"""
+    # The stored vector is rarely read by callers; keep it off the wire
+    if not search_params.get("include_embedding"):
+        fields = ("embedding", *fields)
+    # An empty $project is rejected by the server, so emit no stage at all
+    return [{"$project": {field: 0 for field in fields}}] if fields else []
+
+
+def _split_filter(search_params: Dict) -> Tuple[Dict, Dict]:
+    """Split search_params["filter"] into indexed prefilter and $match parts
+
+    Top-level operators such as $or may span unindexed fields, so they always
+    go to the $match part.
+    """
+    prefilter, postfilter = {}, {}
+    for field, condition in search_params.get("filter", {}).items():
+        target = prefilter if field in VECTOR_FILTER_PATHS else postfilter
+        target[field] = condition
+    return prefilter, postfilter
+
+
+def _vector_pipeline(query_embedding: Binary, search_params: Dict) -> List[Dict]:
+    """Build the $vectorSearch branch of the hybrid search"""
+    pipeline = [
+        _vector_stage(query_embedding, search_params),
+        {
+            "$addFields": {
+                "search_score": {"$meta": "vectorSearchScore"},
+                "vector_score": {"$meta": "vectorSearchScore"},
+                "text_score": {"$literal": 0},
+            }
+        },
+        *_exclude_stages(search_params),
+    ]
+
+    # Filter on fields the vector index can't prefilter by
+    _, postfilter = _split_filter(search_params)
+    if postfilter:
+        pipeline.insert(1, {"$match": postfilter})
+
+    # Add sorting if specified
+    if "sort" in search_params:
+        pipeline.append({"$sort": dict(search_params["sort"])})
+
+    return pipeline
+
+
+def _text_pipeline(query_text: str, search_params: Dict) -> List[Dict]:
+    """Build the $search branch of the hybrid search"""
+    pipeline = [
+        _text_stage(query_text, search_params),
+        {
+            "$addFields": {
+                "search_score": {"$meta": "searchScore"},
+                "vector_score": {"$literal": 0},
+                "text_score": {"$meta": "searchScore"},
+            }
+        },
+        *_exclude_stages(search_params),
+    ]
+
+    # Add filters if specified
+    if "filter" in search_params:
+        pipeline.insert(1, {"$match": search_params["filter"]})
+
+    # Add sorting and limit if specified
+    if "sort" in search_params:
+        pipeline.append({"$sort": dict(search_params["sort"])})
+    if "limit" in search_params:
+        pipeline.append({"$limit": search_params["limit"]})
+
+    return pipeline
+
+
+def _rank_fusion_pipeline(
+    query_embedding: Binary, query_text: str, search_params: Dict
+) -> List[Dict]:
+    """Build a single reciprocal-rank-fusion pipeline over both branches"""
+    limit = search_params.get("limit", 100)
+    # Input pipelines may only hold ranking and filtering stages
+    vector_branch = [_vector_stage(query_embedding, search_params)]
+    _, postfilter = _split_filter(search_params)
+    if postfilter:
+        vector_branch.append({"$match": postfilter})
+
+    text_branch = [_text_stage(query_text, search_params)]
+    if "filter" in search_params:
+        text_branch.append({"$match": search_params["filter"]})
+    text_branch.append({"$limit": limit})
+
+    pipeline = [
+        {
+            "$rankFusion": {
+                "input": {
+                    "pipelines": {
+                        "vector": vector_branch,
+                        "text": text_branch,
+                    }
+                },
+                "combination": {"weights": FUSION_WEIGHTS},
+                "scoreDetails": True,
+            }
+        },
+        {"$addFields": {"_score_details": {"$meta": "scoreDetails"}}},
+        {
+            "$addFields": {
+                "search_score": {"$meta": "score"},
+                "vector_score": _fusion_score("vector"),
+                "text_score": _fusion_score("text"),
+            }
+        },
+        *_exclude_stages(search_params, "_score_details"),
+    ]
+
+    if "sort" in search_params:
+        pipeline.append({"$sort": dict(search_params["sort"])})
+    pipeline.append({"$limit": limit})
+
+    return pipeline
+
+
+def _fusion_score(pipeline_name: str) -> Dict:
+    """Expression reading one input pipeline's raw score from scoreDetails"""
+    detail = {
+        "$first": {
+            "$filter": {
+                "input": "$_score_details.details",
+                "cond": {"$eq": ["$$this.inputPipelineName", pipeline_name]},
+            }
+        }
+    }
+    # Chunks missed by a pipeline have no raw score from it
+    return {"$ifNull": [{"$getField": {"field": "value", "input": detail}}, 0]}
+
+
+def _merge_stages(search_params: Dict) -> List[Dict]:
+    """Stages that merge each chunk's copies by max score, then sort and limit"""
+    stages = [
+        {
+            "$group": {
+                "_id": "$_id",
+                "root": {"$mergeObjects": "$$ROOT"},
+                **{field: {"$max": f"${field}"} for field in _SCORE_FIELDS},
+            }
+        },
+        {
+            "$replaceRoot": {
+                "newRoot": {
+                    "$mergeObjects": [
+                        "$root",
+                        {field: f"${field}" for field in _SCORE_FIELDS},
+                    ]
+                }
+            }
+        },
+        {"$sort": dict(search_params.get("sort", [("search_score", -1)]))},
+    ]
+    if "limit" in search_params:
+        stages.append({"$limit": search_params["limit"]})
+    return stages
@@ -0,0 +1,191 @@
+"""Cached query embeddings with a precomputed layer and a persistent LRU"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import streamlit as st
+
+from utils.ai_services import get_embedding, get_embeddings
+
+CACHE_DIR = os.path.expanduser("~/.cache/cambium")
+LRU_CAPACITY = 1000
+LRU_TTL_SECONDS = 3600
+# New entries are written to disk in the background at most this often
+SAVE_INTERVAL_SECONDS = 30
+
+
+def _cache_key(text: str) -> str:
+    """Hash the query text into a fixed-size cache key"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbedder:
+    """Embed queries via precomputed vectors, then an LRU, then the API"""
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], List[float]],
+        batch_embed_fn: Callable[[List[str]], List[List[float]]] = None,
+        capacity: int = LRU_CAPACITY,
+        ttl: float = LRU_TTL_SECONDS,
+        cache_dir: str = CACHE_DIR,
+    ):
+        self._embed_fn = embed_fn
+        self._batch_embed_fn = batch_embed_fn
+        self._capacity = capacity
+        self._ttl = ttl
+        self._vectors_path = os.path.join(cache_dir, "embeddings.npy")
+        self._index_path = os.path.join(cache_dir, "embeddings.json")
+        self._precomputed: Dict[str, np.ndarray] = {}
+        self._lru: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes flushes; held while writing, never by lookups
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+        threading.Thread(
+            target=self._flush_periodically,
+            name="embedding-cache-flush",
+            daemon=True,
+        ).start()
+        atexit.register(self.flush)
+
+    def warmup(self, texts: Iterable[str]):
+        """Precompute embeddings for questions that are known in advance
+
+        Texts missing from both cache layers are embedded in one batch request
+        when a batch function is available.
+        """
+        missing = []
+        for text in map(str.strip, texts):
+            key = _cache_key(text)
+            if key in self._precomputed:
+                continue
+            embedding = self._lookup(key)
+            if embedding is not None:
+                self._precomputed[key] = embedding
+            else:
+                missing.append(text)
+
+        if not missing:
+            return
+
+        if self._batch_embed_fn is not None:
+            embeddings = self._batch_embed_fn(missing)
+        else:
+            embeddings = [self._embed_fn(text) for text in missing]
+
+        for text, embedding in zip(missing, embeddings):
+            key = _cache_key(text)
+            self._precomputed[key] = self._store(key, embedding)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return the (read-only) embedding of text, calling the API on a miss"""
+        # Surrounding whitespace doesn't change the question; share one entry
+        text = text.strip()
+        key = _cache_key(text)
+
+        embedding = self._precomputed.get(key)
+        if embedding is not None:
+            return embedding
+
+        embedding = self._lookup(key)
+        if embedding is not None:
+            return embedding
+
+        return self._store(key, self._embed_fn(text))
+
+    def _lookup(self, key: str) -> np.ndarray:
+        """Return an unexpired LRU entry, or None"""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and time.time() - entry[0] < self._ttl:
+                self._lru.move_to_end(key)
+                return entry[1]
+        return None
+
+    def _store(self, key: str, embedding: List[float]) -> np.ndarray:
+        """Add a freshly computed embedding to the LRU, to be persisted later"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+
+        with self._lock:
+            self._lru[key] = (time.time(), embedding)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._capacity:
+                self._lru.popitem(last=False)
+            self._dirty = True
+
+        return embedding
+
+    def _load(self):
+        """Restore unexpired LRU entries persisted by a previous process
+
+        The vectors file is memory-mapped, so startup only reads the small
+        key index; rows are paged in from disk as they are looked up.
+        """
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            vectors = np.load(self._vectors_path, mmap_mode="r")
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading embedding cache: {e}")
+            return
+
+        # The two files are replaced one after the other; skip a torn pair
+        if len(index) != len(vectors):
+            return
+
+        now = time.time()
+        for row, (key, created) in enumerate(index):
+            if now - created < self._ttl:
+                self._lru[key] = (created, vectors[row])
+
+    def _flush_periodically(self):
+        """Background loop persisting new entries off the query path"""
+        while True:
+            time.sleep(SAVE_INTERVAL_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Persist the LRU to disk if it changed since the last flush"""
+        with self._save_lock:
+            # Snapshot under the lock; the slow stack and writes happen after
+            with self._lock:
+                if not self._dirty or not self._lru:
+                    return
+                index = [[key, created] for key, (created, _) in self._lru.items()]
+                embeddings = [embedding for _, embedding in self._lru.values()]
+                self._dirty = False
+
+            try:
+                vectors = np.stack(embeddings)
+                os.makedirs(os.path.dirname(self._vectors_path), exist_ok=True)
+                # Write to temp files and rename, so a memory-mapped previous
+                # version stays valid for any rows still referenced from it
+                with open(f"{self._vectors_path}.tmp", "wb") as f:
+                    np.save(f, vectors)
+                with open(f"{self._index_path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(f"{self._vectors_path}.tmp", self._vectors_path)
+                os.replace(f"{self._index_path}.tmp", self._index_path)
+            except Exception as e:
+                print(f"Error saving embedding cache: {e}")
+                with self._lock:
+                    self._dirty = True
+
+
+@st.cache_resource
+def get_embedder() -> CachedEmbedder:
+    """Get the process-wide embedder shared by all sessions"""
+    return CachedEmbedder(get_embedding, get_embeddings)
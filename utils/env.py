@@ -0,0 +1,50 @@
+"""Secrets and configuration, resolved once per process"""
+
+import os
+from collections.abc import Mapping
+
+import streamlit as st
+
+KEYS = ("GEMINI_API_KEY", "MONGODB_URI", "APP_PASSWORD")
+
+
+def _from_secrets_file(key: str):
+    """Read key from st.secrets, or None when there is no secrets file"""
+    try:
+        return st.secrets.get(key)
+    # Streamlit 1.44+ raises StreamlitSecretNotFoundError, a subclass
+    except FileNotFoundError:
+        return None
+
+
+class _Secrets(Mapping):
+    """Read-only view of KEYS, each resolved on first access and memoized
+
+    Resolution is lazy so pages that never touch a key don't need it set.
+    Environment variables take precedence over .streamlit/secrets.toml.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def __getitem__(self, key: str) -> str:
+        if key not in KEYS:
+            raise KeyError(key)
+        value = self._values.get(key)
+        if value is None:
+            value = os.environ.get(key) or _from_secrets_file(key)
+            if not value:
+                raise KeyError(
+                    f"{key} is not set in the environment or .streamlit/secrets.toml"
+                )
+            self._values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __len__(self) -> int:
+        return len(KEYS)
+
+
+SECRETS = _Secrets()
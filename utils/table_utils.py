@@ -1,80 +1,65 @@
 """Utilities for handling markdown tables and HTML conversion"""
 
+import functools
 import html as html_lib
-from typing import List, Dict
+import io
+import itertools
+from typing import Iterator, List, Dict, Tuple
 import re
 
+# Chunk texts are immutable, so each distinct table is checked and rendered once
+_CACHE_SIZE = 2048
 
+
+# A markdown header separator row such as "| --- | :---: |"
+_SEP_RE = re.compile(r"^\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?$")
+
+
+def _non_empty_lines(text: str) -> List[str]:
+    """Strip text into its non-blank, stripped lines"""
+    return [line.strip() for line in text.strip().splitlines() if line.strip()]
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
 def is_markdown_table(text: str) -> bool:
     """Check if text is a markdown table or a delimited text"""
-    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
-
-    if not lines:
+    # Neither check can pass without a pipe; skip splitting plain text
+    if "|" not in text:
         return False
 
-    pipe_counts = [line.count("|") for line in lines]
+    lines = _non_empty_lines(text)
 
-    if min(pipe_counts) >= 3:
+    if all(line.count("|") >= 3 for line in lines):
         return True
 
-    if len(lines) >= 2:
-        separator_line = lines[1]
-        if "|" in separator_line:
-            separator_cells = [cell.strip() for cell in separator_line.split("|")]
-            separator_cells = [cell for cell in separator_cells if cell]
-            if all(
-                cell.replace("-", "").replace(":", "") == "" for cell in separator_cells
-            ):
-                return True
-
-    return False
-
-
-def parse_markdown_table(text: str) -> List[List[str]]:
-    """Parse markdown table or delimited text into a 2D list of cells"""
-    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
-    table_data = []
-
-    for i, line in enumerate(lines):
-        if (
-            i == 1
-            and "-" in line
-            and all(
-                cell.replace("-", "").replace(":", "") == ""
-                for cell in line.split("|")
-                if cell.strip()
-            )
-        ):
+    return len(lines) >= 2 and "|" in lines[1] and bool(_SEP_RE.match(lines[1]))
+
+
+def parse_markdown_table(text: str) -> Iterator[Tuple[str, ...]]:
+    """Parse markdown table or delimited text, yielding one tuple of cells per row
+
+    Not cached itself: format_table_html, its only caller, caches the HTML.
+    """
+    for i, line in enumerate(_non_empty_lines(text)):
+        if i == 1 and _SEP_RE.match(line):
             continue
 
-        cells = [cell.strip() for cell in line.split("|")]
-        cells = [cell for cell in cells if cell]
-
-        if cells:
-            if any(len(cell) > 100 for cell in cells):
-                max_cells = len(cells)
-                current_row = []
-                for cell in cells:
-                    if len(cell) > 100:
-                        if current_row:
-                            table_data.append(current_row)
-                        table_data.append([cell])
-                        current_row = []
-                    else:
-                        current_row.append(cell)
-                if current_row:
-                    table_data.append(current_row)
+        cells = [cell for cell in map(str.strip, line.split("|")) if cell]
+
+        # Long cells get a row of their own; runs of short cells stay together
+        for is_long, group in itertools.groupby(cells, key=_is_long_cell):
+            if is_long:
+                yield from ((cell,) for cell in group)
             else:
-                table_data.append(cells)
+                yield tuple(group)
 
-    return table_data
 
+def _is_long_cell(cell: str) -> bool:
+    """Whether a cell is too long to share a row with its neighbours"""
+    return len(cell) > 100
 
-def format_table_html(markdown_text: str) -> str:
-    """Convert markdown table to HTML with RTL support and enhanced styling"""
-    table_data = parse_markdown_table(markdown_text)
 
-    table_styles = """
+_TABLE_STYLES = """
         width: 100%;
         border-collapse: collapse;
         margin: 15px 0;
@@ -84,7 +69,7 @@ def format_table_html(markdown_text: str) -> str:
         overflow: hidden;
     """
 
-    header_styles = """
+_HEADER_STYLES = """
         background-color: #f8f9fa;
         color: #1a1a1a;
         font-weight: 600;
@@ -94,14 +79,14 @@ def format_table_html(markdown_text: str) -> str:
         white-space: nowrap;
     """
 
-    cell_styles = """
+_CELL_STYLES = """
         padding: 10px 12px;
         text-align: right;
         border: 1px solid #e0e0e0;
         line-height: 1.4;
     """
 
-    row_hover_style = """
+_ROW_HOVER_STYLE = """
     <style>
         .custom-table tbody tr:hover {
             background-color: #f5f5f5;
@@ -113,28 +98,49 @@ def format_table_html(markdown_text: str) -> str:
     </style>
     """
 
-    output = f"{row_hover_style}<div dir='rtl'><table class='custom-table' style='{table_styles}'>"
+# Per-cell templates and the table prologue, with the styles baked in
+_TH_TEMPLATE = f"<th style='{_HEADER_STYLES}'>{{cell}}</th>"
+_TD_TEMPLATE = f"<td style='{_CELL_STYLES}'>{{cell}}</td>"
+_TABLE_OPEN = (
+    f"{_ROW_HOVER_STYLE}<div dir='rtl'>"
+    f"<table class='custom-table' style='{_TABLE_STYLES}'>"
+)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def format_table_html(markdown_text: str) -> str:
+    """Convert markdown table to HTML with RTL support and enhanced styling"""
+    rows = parse_markdown_table(markdown_text)
+    _esc = html_lib.escape
+
+    buf = io.StringIO()
+    buf.write(_TABLE_OPEN)
 
-    if table_data:
-        output += "<thead><tr>"
-        for cell in table_data[0]:
-            escaped_cell = html_lib.escape(cell)
+    header = next(rows, None)
+    if header is not None:
+        buf.write("<thead><tr>")
+        for cell in header:
+            escaped_cell = _esc(cell)
             if not escaped_cell or escaped_cell.strip("-| ") == "":
                 escaped_cell = "&nbsp;"
-            output += f"<th style='{header_styles}'>{escaped_cell}</th>"
-        output += "</tr></thead>"
-
-    if len(table_data) > 1:
-        output += "<tbody>"
-        for row in table_data[1:]:
-            output += "<tr>"
-            for cell in row:
-                escaped_cell = html_lib.escape(cell)
-                if not escaped_cell or escaped_cell.strip("-| ") == "":
-                    escaped_cell = "&nbsp;"
-                output += f"<td style='{cell_styles}'>{escaped_cell}</td>"
-            output += "</tr>"
-        output += "</tbody>"
-
-    output += "</table></div>"
-    return output
+            buf.write(_TH_TEMPLATE.format(cell=escaped_cell))
+        buf.write("</tr></thead>")
+
+    # The body is only opened once a second row actually arrives
+    in_body = False
+    for row in rows:
+        if not in_body:
+            buf.write("<tbody>")
+            in_body = True
+        buf.write("<tr>")
+        for cell in row:
+            escaped_cell = _esc(cell)
+            if not escaped_cell or escaped_cell.strip("-| ") == "":
+                escaped_cell = "&nbsp;"
+            buf.write(_TD_TEMPLATE.format(cell=escaped_cell))
+        buf.write("</tr>")
+    if in_body:
+        buf.write("</tbody>")
+
+    buf.write("</table></div>")
+    return buf.getvalue()
@@ -1,8 +1,10 @@
 """UI components and styling for the Streamlit app"""
 
 import streamlit as st
+import hmac
 import html as html_lib
 from typing import List, Dict
+from utils.env import SECRETS
 
 # from dotenv import load_dotenv
 from time import sleep
@@ -12,31 +14,11 @@ import re
 # Load environment variables
 # load_dotenv()
 
+# Opening tags for format_message, built once instead of on every stream frame
+_DIRECTION_DIVS = {True: '<div dir="rtl">', False: '<div dir="ltr">'}
 
-def redirect_page():
-    """Redirect to a different page"""
-    sleep(0.5)
-    st.switch_page("Home.py")
-
-
-def setup_page_config():
-    """Configure Streamlit page settings"""
-    st.set_page_config(
-        page_title="נהלי קמביום - צ'אטבוט",
-        page_icon="📚",
-        layout="wide",
-    )
-
-
-def check_authentication() -> bool:
-    """Check if user is authenticated"""
-    return st.session_state.authenticated
-
-
-def add_custom_css():
-    """Add custom CSS for RTL support and styling"""
-    st.markdown(
-        """
+# Injected by add_custom_css on every run
+_CSS = """
         <style>
         /* RTL Support */
         .element-container, .stMarkdown, .stButton {
@@ -98,11 +80,34 @@ def add_custom_css():
             background-color: #f5f5f5;
         }
         </style>
-        """,
-        unsafe_allow_html=True,
+        """
+
+
+def redirect_page():
+    """Redirect to a different page"""
+    sleep(0.5)
+    st.switch_page("Home.py")
+
+
+def setup_page_config():
+    """Configure Streamlit page settings"""
+    st.set_page_config(
+        page_title="נהלי קמביום - צ'אטבוט",
+        page_icon="📚",
+        layout="wide",
     )
 
 
+def check_authentication() -> bool:
+    """Check if user is authenticated (a session-local flag, cheap per rerun)"""
+    return st.session_state.get("authenticated", False)
+
+
+def add_custom_css():
+    """Add custom CSS for RTL support and styling"""
+    st.markdown(_CSS, unsafe_allow_html=True)
+
+
 def init_session_state():
     """Initialize session state variables"""
     if "authenticated" not in st.session_state:
@@ -111,18 +116,27 @@ def init_session_state():
         st.session_state.conversation_history = []
     if "show_examples" not in st.session_state:
         st.session_state.show_examples = True
+    if "source_md_cache" not in st.session_state:
+        st.session_state.source_md_cache = {}
 
 
 def authenticate() -> bool:
     """Handle password authentication"""
-    if st.session_state.authenticated:
+    if st.session_state.get("authenticated"):
         return True
 
     st.title("🔒 password protected")
     password = st.text_input("Enter password :", type="password")
 
     if st.button("Enter"):
-        if password == st.secrets["APP_PASSWORD"]:
+        try:
+            expected = SECRETS["APP_PASSWORD"].encode()
+        except KeyError as e:
+            # No password configured: refuse every login rather than crash
+            print(f"Authentication error: {e}")
+            expected = None
+        # Constant-time compare, so response timing doesn't leak the password
+        if expected is not None and hmac.compare_digest(password.encode(), expected):
             st.session_state.authenticated = True
             st.rerun()
         else:
@@ -133,5 +147,4 @@ def authenticate() -> bool:
 
 def format_message(text: str, is_hebrew: bool = True) -> str:
     """Format message with appropriate text direction"""
-    direction = "rtl" if is_hebrew else "ltr"
-    return f'<div dir="{direction}">{text}</div>'
+    return f"{_DIRECTION_DIVS[bool(is_hebrew)]}{text}</div>"